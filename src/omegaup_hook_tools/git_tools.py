@@ -5,6 +5,8 @@ Utility functions used to write git hooks.
 '''
 
 import argparse
+import atexit
+import functools
 import itertools
 import logging
 import multiprocessing
@@ -14,8 +16,9 @@ import re
 import shlex
 import subprocess
 import sys
-from typing import (Any, Iterable, Iterator, List, Mapping, Optional, Sequence,
-                    Text)
+import threading
+from typing import (Any, Dict, IO, Iterable, Iterator, List, Mapping, Optional,
+                    Sequence, Text, Tuple)
 
 
 HOOK_TOOLS_ROOT = os.path.abspath(os.path.join(__file__, '..'))
@@ -60,13 +63,11 @@ def get_explicit_file_list(commits: List[Text]) -> Sequence[Text]:
     '''
     # If a -- was explicitly passed, honor it and don't try to guess what is
     # what.
-    try:
-        idx = commits.index('--')
-        files = commits[idx + 1:]
-        commits[idx:] = []
-        return files
-    except ValueError:
-        pass
+    for idx, arg in enumerate(commits):
+        if arg == '--':
+            files = commits[idx + 1:]
+            del commits[idx:]
+            return files
 
     # Otherwise let git-rev-parse let us know what are revisions and we treat
     # everything following the first non-revision as a file.
@@ -111,17 +112,59 @@ def _validate_args(args: argparse.Namespace, files: Sequence[Text]) -> bool:
     return True
 
 
+def _iter_nul_tokens(stream: IO[bytes]) -> Iterator[bytes]:
+    '''Yields the NUL-terminated tokens in |stream| as they are read.'''
+    buffer = bytearray()
+    while True:
+        chunk = stream.read1(65536)  # type: ignore
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        start = 0
+        while True:
+            end = buffer.find(b'\x00', start)
+            if end < 0:
+                break
+            yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+    if buffer:
+        yield bytes(buffer)
+
+
+def _stream_git_tokens(cmd: Sequence[Text]) -> Iterator[bytes]:
+    '''Runs |cmd| and yields the NUL-terminated tokens in its output.'''
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                          cwd=root_dir()) as proc:
+        assert proc.stdout is not None
+        yield from _iter_nul_tokens(proc.stdout)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
 def _get_all_files() -> Iterator[bytes]:
     '''Returns the list of all files at HEAD (and maybe in the index).'''
 
-    for path in subprocess.run(['/usr/bin/git', 'ls-files', '-z'],
-                               check=True,
-                               stdout=subprocess.PIPE,
-                               cwd=root_dir()).stdout.split(b'\x00'):
+    for path in _stream_git_tokens(['/usr/bin/git', 'ls-files', '-z']):
         if os.path.isfile(path):
             yield path
 
 
+def _parse_diff_tree_header(header: bytes) -> Tuple[bytes, bytes]:
+    '''Returns the destination mode and status of a raw diff-tree header.
+
+    The header looks like `:<src mode> <dst mode> <src sha> <dst sha>
+    <status>`, where the status is a single letter optionally followed by a
+    score. This is equivalent to matching GIT_DIFF_TREE_PATTERN, but avoids
+    the regex engine.
+    '''
+    parts = header.split(b' ')
+    assert (len(parts) == 5 and parts[0][:1] == b':' and parts[1].isdigit()
+            and parts[4][:1] and parts[4][:1] in b'ACDMRTUX'
+            and (len(parts[4]) == 1 or parts[4][1:].isdigit())), header
+    return parts[1], parts[4][:1]
+
+
 def _get_changed_files(commits: List[Text]) -> Iterator[bytes]:
     ''' Returns the list of files that were modified in the specified range.'''
 
@@ -136,30 +179,21 @@ def _get_changed_files(commits: List[Text]) -> Iterator[bytes]:
             return
         cmd = ['/usr/bin/git', 'diff-tree', '-r', '-z',
                '--diff-filter=d'] + commits
-    tokens = subprocess.run(cmd,
-                            check=True,
-                            stdout=subprocess.PIPE,
-                            cwd=root_dir()).stdout.split(b'\x00')
-    idx = 0
-    while idx < len(tokens) - 1:
-        match = GIT_DIFF_TREE_PATTERN.match(tokens[idx])
-        assert match, tokens[idx]
-        filemode, status = match.groups()
+    tokens = _stream_git_tokens(cmd)
+    for token in tokens:
+        filemode, status = _parse_diff_tree_header(token)
+        path = next(tokens, None)
+        if status in (b'C', b'R'):
+            # Copies and renames have both a source and a destination path.
+            path = next(tokens, None)
+        assert path is not None, token
         if filemode == GIT_DIRECTORY_ENTRY_MODE:
             # Files with the 160000 mode are not actually files or
             # directories.  They just are directory entries, and they
             # typically appear in the path where submodules are inserted
             # into the tree.
-            idx += 2
             continue
-        src = tokens[idx + 1]
-        if status in (b'C', b'R'):
-            dest = tokens[idx + 2]
-            idx += 3
-            yield dest
-        else:
-            idx += 2
-            yield src
+        yield path
 
 
 def _files_to_consider(args: argparse.Namespace) -> List[Text]:
@@ -171,7 +205,9 @@ def _files_to_consider(args: argparse.Namespace) -> List[Text]:
     else:
         result = _get_changed_files(args.commits)
 
-    return sorted([str(filename, encoding='utf-8') for filename in result])
+    # UTF-8 preserves code point order, so sorting the raw bytes yields the
+    # same order as sorting the decoded names.
+    return [filename.decode('utf-8') for filename in sorted(result)]
 
 
 def prompt(question: Text, default: bool = True) -> bool:
@@ -205,6 +241,84 @@ def prompt(question: Text, default: bool = True) -> bool:
     return default
 
 
+class _CatFileBatch:
+    '''A long-lived `git cat-file --batch` process.
+
+    This allows reading the contents of many objects without having to spawn
+    one `git show` process per file.
+    '''
+
+    def __init__(self, cwd: Text) -> None:
+        self.__cwd = cwd
+        self.__lock = threading.Lock()
+        self.__process: Optional['subprocess.Popen[bytes]'] = None
+
+    def __ensure_process(self) -> 'subprocess.Popen[bytes]':
+        if self.__process is None:
+            self.__process = subprocess.Popen(  # pylint: disable=R1732
+                ['/usr/bin/git', 'cat-file', '--batch'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=self.__cwd)
+        return self.__process
+
+    def get(self, rev: Text, path: Text) -> bytes:
+        '''Returns the contents of |path| at |rev|.'''
+        with self.__lock:
+            process = self.__ensure_process()
+            stdin: IO[bytes] = process.stdin  # type: ignore
+            stdout: IO[bytes] = process.stdout  # type: ignore
+            stdin.write(f'{rev}:{path}\n'.encode('utf-8'))
+            stdin.flush()
+            header = stdout.readline()
+            if not header:
+                raise RuntimeError('git cat-file --batch exited unexpectedly')
+            # The header is either `<sha> <type> <size>`, or the requested
+            # object name (which can contain spaces) followed by `missing` or
+            # `ambiguous`.
+            tokens = header.rstrip(b'\n').rsplit(b' ', 2)
+            if len(tokens) == 3 and tokens[2].isdigit():
+                contents = stdout.read(int(tokens[2]))
+                # Every object is followed by a trailing newline.
+                stdout.read(1)
+                if tokens[1] == b'blob':
+                    return contents
+            raise FileNotFoundError(
+                f'{rev}:{path}: {str(header.strip(), encoding="utf-8")}')
+
+    def close(self) -> None:
+        '''Terminates the underlying process, if any.'''
+        with self.__lock:
+            if self.__process is None:
+                return
+            process, self.__process = self.__process, None
+            assert process.stdin is not None
+            process.stdin.close()
+            process.wait()
+            assert process.stdout is not None
+            process.stdout.close()
+
+
+_CAT_FILE_BATCHES: Dict[Text, _CatFileBatch] = {}
+_CAT_FILE_BATCHES_LOCK = threading.Lock()
+
+
+def _cat_file_batch(cwd: Text) -> _CatFileBatch:
+    '''Returns the shared _CatFileBatch for |cwd|.'''
+    with _CAT_FILE_BATCHES_LOCK:
+        if cwd not in _CAT_FILE_BATCHES:
+            _CAT_FILE_BATCHES[cwd] = _CatFileBatch(cwd)
+        return _CAT_FILE_BATCHES[cwd]
+
+
+@atexit.register
+def _close_cat_file_batches() -> None:
+    with _CAT_FILE_BATCHES_LOCK:
+        for batch in _CAT_FILE_BATCHES.values():
+            batch.close()
+        _CAT_FILE_BATCHES.clear()
+
+
 def file_contents(args: argparse.Namespace, root: Text,
                   filename: Text) -> bytes:
     '''Returns contents of |filename| at the revision specified by |args|.'''
@@ -212,24 +326,39 @@ def file_contents(args: argparse.Namespace, root: Text,
         # Zero or one commits (where the former is a shorthand for 'HEAD')
         # always diff against the current contents of the file in the
         # filesystem.
-        with open(os.path.join(root, filename), 'rb') as working_dir_file:
-            return working_dir_file.read()
+        # An unbuffered read sizes a single read() from fstat(), without
+        # allocating an intermediate buffer.
+        with open(os.path.join(root, filename), 'rb',
+                  buffering=0) as working_dir_file:
+            return working_dir_file.readall()
     else:
-        return subprocess.run(
-            ['/usr/bin/git', 'show', f'{args.commits[-1]}:{filename}'],
-            check=True,
-            stdout=subprocess.PIPE,
-            cwd=root).stdout
+        return _cat_file_batch(root).get(args.commits[-1], filename)
 
 
+@functools.lru_cache(maxsize=1)
 def root_dir() -> Text:
-    '''Returns the top-level directory of the project.'''
+    '''Returns the top-level directory of the project.
+
+    The result is cached, since the top-level directory does not change during
+    the lifetime of the process.
+    '''
     return subprocess.run(['/usr/bin/git', 'rev-parse', '--show-toplevel'],
                           universal_newlines=True,
                           check=True,
                           stdout=subprocess.PIPE).stdout.strip()
 
 
+def available_cpu_count() -> int:
+    '''Returns the number of CPUs that this process is allowed to run on.
+
+    In containers, this can be much smaller than the number of CPUs in the
+    machine.
+    '''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
 def parse_arguments(
         tool_description: Optional[Text] = None,
         extra_arguments: Sequence[Argument] = ()) -> argparse.Namespace:
@@ -248,7 +377,7 @@ def parse_arguments(
               'Disables all prompts.'))
     parser.add_argument(
         '--jobs', '-j', type=int, help='Number of parallel jobs',
-        default=multiprocessing.cpu_count())
+        default=available_cpu_count())
     for argument in extra_arguments:
         argument.add_to(parser)
     subparsers = parser.add_subparsers(dest='tool')
@@ -343,7 +472,7 @@ def get_fix_commandline(args: argparse.Namespace,
         itertools.chain(
             _get_quoted_command_name(args.command_name if 'command_name' in
                                      args else None),
-            (shlex.quote(p) for p in _get_fix_args([], args, files)),
+            (shlex.join(_get_fix_args([], args, files)), ),
         ))
 
 
@@ -359,6 +488,15 @@ def verify_toolchain(binaries: Mapping[Text, Text]) -> bool:
     return success
 
 
+def _rev_parse(*revs: Text) -> Sequence[Text]:
+    '''Resolves all of |revs| to object names in a single git invocation.'''
+    return subprocess.run(
+        ['/usr/bin/git', 'rev-parse'] + list(revs),
+        universal_newlines=True,
+        check=True,
+        stdout=subprocess.PIPE).stdout.split()
+
+
 def _is_single_commit_pushed(args: argparse.Namespace) -> bool:
     '''Returns whether a single commit is being pushed.'''
     if not args.commits:
@@ -370,15 +508,8 @@ def _is_single_commit_pushed(args: argparse.Namespace) -> bool:
         pushed_commit = 'HEAD'
     else:
         pushed_commit = args.commits[1]
-    return merge_base == subprocess.run(
-        [
-            '/usr/bin/git',
-            'rev-parse',
-            f'{pushed_commit}^',
-        ],
-        universal_newlines=True,
-        check=True,
-        stdout=subprocess.PIPE).stdout.strip()
+    merge_base_hash, parent_hash = _rev_parse(merge_base, f'{pushed_commit}^')
+    return merge_base_hash == parent_hash
 
 
 def attempt_automatic_fixes(scriptname: Text,
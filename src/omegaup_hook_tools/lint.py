@@ -6,16 +6,22 @@
 from __future__ import print_function
 
 import argparse
+import collections
 import concurrent.futures
 import enum
+import functools
+import itertools
 import json
 import logging
+import multiprocessing
+import os
 import os.path
 import re
 import sys
+import threading
 import traceback
-from typing import (Any, Callable, Dict, Iterator, List, Mapping, Optional,
-                    Sequence, Set, Text, Tuple)
+from typing import (Any, Callable, Dict, FrozenSet, Iterator, List, Mapping,
+                    Optional, Pattern, Sequence, Set, Text, Tuple)
 
 from . import linters, git_tools
 
@@ -38,7 +44,33 @@ _LINTER_MAPPING: Dict[Text, LinterFactory] = {
     'whitespace': linters.WhitespaceLinter,
 }
 
-_ROOT = git_tools.root_dir()
+# Characters that need to be escaped in GitHub workflow commands.
+_GITHUB_ESCAPE_TABLE = str.maketrans({
+    '%': '%25',
+    '\r': '%0D',
+    '\n': '%0A',
+})
+
+# Matches allowlist patterns that end with an extension anchor.
+_EXTENSION_ANCHOR_RE = re.compile(
+    r'^([^|]*)\\\.(?:(\w+)|\((?:\?:)?(\w+(?:\|\w+)*)\))\$$')
+
+# Matches the constructs that change meaning (or stop compiling) when a
+# pattern is joined with others into a single alternation: inline flags, named
+# groups, conditionals and backreferences.
+_UNJOINABLE_PATTERN_RE = re.compile(r'\(\?[aiLmsux(P]|\\[1-9g]')
+
+# The minimum number of files for which in-process linters are run in a
+# process pool. Starting the pool's workers takes a few hundred milliseconds,
+# which is about as long as the whitespace linter takes to go through a
+# thousand files of typical size on its own, so smaller runs are faster in a
+# single process.
+_MIN_FILES_FOR_PROCESS_POOL = 1000
+
+# The contents of the files that are shared across linters. Each worker
+# process has its own copy. It only lives for a single run: it is cleared when
+# the run's _Executors are closed, which also shuts down the worker processes.
+_FILE_CONTENTS_CACHE: Dict[Text, bytes] = {}
 
 
 class DiagnosticsOutput(enum.Enum):
@@ -52,11 +84,163 @@ class DiagnosticsOutput(enum.Enum):
         return (DiagnosticsOutput.STDERR, DiagnosticsOutput.GITHUB)
 
 
+def _match_any(patterns: Tuple[Pattern[Text], ...], filename: Text) -> bool:
+    '''Returns whether any of |patterns| matches |filename|.'''
+    return any(pattern.match(filename) for pattern in patterns)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_patterns(
+        patterns: Tuple[Text, ...]) -> Optional[Callable[[Text], Any]]:
+    '''Returns a function that matches a filename against any of |patterns|.
+
+    Returns None if there are no patterns. Whenever possible, |patterns| are
+    compiled into a single alternation. The result is cached, since many
+    linters share the same allowlist/denylist.
+    '''
+    if not patterns:
+        return None
+    if any(_UNJOINABLE_PATTERN_RE.search(pattern) for pattern in patterns):
+        return functools.partial(
+            _match_any, tuple(re.compile(pattern) for pattern in patterns))
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)).match
+
+
+def _file_contents(args: argparse.Namespace, filename: Text) -> bytes:
+    '''Returns the contents of |filename|, reading it at most once if possible.
+
+    When validating, or when reading from a commit, the contents cannot change
+    during the run, so they are shared by all the linters. When fixing the
+    working tree, each linter must see the fixes made by the previous ones.
+    '''
+    if args.tool != 'validate' and len(args.commits) in (0, 1):
+        return git_tools.file_contents(args, git_tools.root_dir(), filename)
+    contents = _FILE_CONTENTS_CACHE.get(filename)
+    if contents is None:
+        contents = git_tools.file_contents(args, git_tools.root_dir(),
+                                           filename)
+        _FILE_CONTENTS_CACHE[filename] = contents
+    return contents
+
+
+def _extension(filename: Text) -> Text:
+    '''Returns the text after the last dot of the basename of |filename|.'''
+    extension = filename[filename.rfind('.') + 1:]
+    if '.' not in filename or '/' in extension:
+        return ''
+    return extension
+
+
+def _index_by_extension(filenames: Sequence[Text]) -> Dict[Text, List[Text]]:
+    '''Groups |filenames| by their extension, preserving their order.'''
+    by_extension: Dict[Text, List[Text]] = collections.defaultdict(list)
+    for filename in filenames:
+        by_extension[_extension(filename)].append(filename)
+    return by_extension
+
+
+@functools.lru_cache(maxsize=None)
+def _allowlist_extensions(
+        patterns: Tuple[Text, ...]) -> Optional[FrozenSet[Text]]:
+    '''Returns the only extensions that |patterns| can possibly match.
+
+    This only understands patterns that end in an extension anchor, like
+    `.*\\.py$` or `.*\\.(js|ts)$`. Returns None if any of the patterns is
+    not of that form, in which case any file could match.
+    '''
+    extensions: Set[Text] = set()
+    for pattern in patterns:
+        match = _EXTENSION_ANCHOR_RE.match(pattern)
+        if not match:
+            return None
+        prefix = match.group(1)
+        if prefix.endswith('\\') or re.search(r'\(\?[^:]', prefix):
+            # The dot is not a literal dot, or there are flags that could
+            # change the meaning of the extension (like case-insensitivity).
+            return None
+        extensions.update((match.group(2) or match.group(3)).split('|'))
+    return frozenset(extensions)
+
+
+@functools.lru_cache(maxsize=None)
+def _allowlist_suffixes(
+        patterns: Tuple[Text, ...]) -> Optional[Tuple[Text, ...]]:
+    '''Returns the filename suffixes that are equivalent to |patterns|.
+
+    Most allowlists only look at the extension, like `.*\\.py$`, and checking
+    those with str.endswith() is much cheaper than matching a regex. Returns
+    None if any of the patterns looks at anything other than the extension.
+    '''
+    extensions = _allowlist_extensions(patterns)
+    if extensions is None:
+        return None
+    for pattern in patterns:
+        match = _EXTENSION_ANCHOR_RE.match(pattern)
+        assert match
+        if match.group(1) not in ('.*', '^.*'):
+            return None
+    return tuple(sorted(f'.{extension}' for extension in extensions))
+
+
+def _has_suffix(suffixes: Tuple[Text, ...], filename: Text) -> bool:
+    '''Returns whether |filename| matches `.*` and one of |suffixes|.'''
+    # `.*` does not match newlines.
+    return filename.endswith(suffixes) and '\n' not in filename
+
+
+def _filter_files(
+    filenames: Sequence[Text],
+    options: Mapping[Text, Any],
+    by_extension: Optional[Mapping[Text, Sequence[Text]]] = None
+) -> Tuple[Text, ...]:
+    '''Returns the files in |filenames| that a linter should consider.
+
+    These are the files that match the allowlist, and not the denylist, in
+    the same order as |filenames|. If |by_extension| is provided, it is used
+    to only consider the files that have an extension that the allowlist can
+    match.
+    '''
+    allowlist_patterns = tuple(options.get('allowlist', []))
+    allowlist = _compile_patterns(allowlist_patterns)
+    if allowlist is None:
+        return ()
+    if by_extension is not None:
+        extensions = _allowlist_extensions(allowlist_patterns)
+        if extensions is not None:
+            candidates = [
+                by_extension[extension] for extension in extensions
+                if extension in by_extension
+            ]
+            if len(candidates) <= 1:
+                filenames = candidates[0] if candidates else ()
+            else:
+                # Keep the order of |filenames| across extensions.
+                candidate_set = set(itertools.chain.from_iterable(candidates))
+                filenames = [
+                    filename for filename in filenames
+                    if filename in candidate_set
+                ]
+    allowed: Callable[[Text], Any] = allowlist
+    suffixes = _allowlist_suffixes(allowlist_patterns)
+    if suffixes is not None:
+        allowed = functools.partial(_has_suffix, suffixes)
+    denylist = _compile_patterns(tuple(options.get('denylist', [])))
+    if denylist is None:
+        return tuple(filter(allowed, filenames))
+    return tuple(filename for filename in filenames
+                 if allowed(filename) and not denylist(filename))
+
+
 def _run_linter_one(
-        linter: linters.Linter, filename: Text, contents: bytes,
+        linter: linters.Linter, args: argparse.Namespace, filename: Text,
         validate_only: bool,
         diagnostics_output: DiagnosticsOutput) -> Tuple[Optional[Text], bool]:
-    '''Runs the linter against one file.'''
+    '''Runs the linter against one file.
+
+    The contents of the file are read here, so that the reads happen in the
+    worker instead of sequentially upfront.
+    '''
+    contents = _file_contents(args, filename)
     try:
         try:
             new_contents, violations = linter.run_one(filename, contents)
@@ -88,15 +272,14 @@ def _run_linter_one(
 
 
 def _run_linter_all(
-        args: argparse.Namespace, linter: linters.Linter,
-        files: Sequence[Text], validate_only: bool,
+        linter: linters.Linter, files: Sequence[Text],
+        contents_callback: linters.ContentsCallback, validate_only: bool,
         diagnostics_output: DiagnosticsOutput
 ) -> Sequence[Tuple[Optional[Text], bool]]:
     try:
         try:
             new_file_contents, original_contents, violations = linter.run_all(
-                files, lambda filename: git_tools.file_contents(
-                    args, _ROOT, filename))
+                files, contents_callback)
         except linters.LinterException:
             raise
         except:  # noqa: bare-except
@@ -115,7 +298,14 @@ def _run_linter_all(
             ) from None
     except linters.LinterException as lex:
         _report_linter_exception(', '.join(files), lex, diagnostics_output)
-        return [(filename, lex.fixable) for filename in files]
+        # Linters that process many files at once can attribute the
+        # diagnostics to the files that caused them. Otherwise, all the files
+        # are considered to have failed.
+        failed_files = {diagnostic.filename for diagnostic in lex.diagnostics}
+        if not failed_files or not failed_files.issubset(files):
+            failed_files = set(files)
+        return [(filename, lex.fixable) for filename in files
+                if filename in failed_files]
 
     result: List[Tuple[Optional[Text], bool]] = []
     for filename in new_file_contents:
@@ -129,24 +319,39 @@ def _run_linter_all(
     return result
 
 
+def _write_file(path: Text, contents: bytes) -> None:
+    '''Writes |contents| to |path| with as few syscalls as possible.'''
+    outfile = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(contents)
+        while view:
+            view = view[os.write(outfile, view):]
+    finally:
+        os.close(outfile)
+
+
 def _report_linter_results(filename: Text, new_contents: bytes, validate: bool,
                            violations: Sequence[Text],
                            fixable: bool) -> Tuple[Text, bool]:
     violations_message = ', '.join(
         f'{git_tools.COLORS.FAIL}{violation}{git_tools.COLORS.NORMAL}'
         for violation in violations)
+    # The message and its newline are printed with a single write, so that
+    # messages from concurrent workers don't get interleaved.
     if validate:
         print(('File '
                f'{git_tools.COLORS.HEADER}{filename}{git_tools.COLORS.NORMAL} '
-               f'lint failed: {violations_message}'),
+               f'lint failed: {violations_message}\n'),
+              end='',
               file=sys.stderr)
     else:
         print(('Fixing '
                f'{git_tools.COLORS.HEADER}{filename}{git_tools.COLORS.NORMAL} '
-               f'({", ".join(violations)})'),
+               f'({", ".join(violations)})\n'),
+              end='',
               file=sys.stderr)
-        with open(os.path.join(_ROOT, filename), 'wb') as outfile:
-            outfile.write(new_contents)
+        _write_file(os.path.join(git_tools.root_dir(), filename),
+                    new_contents)
     return filename, fixable
 
 
@@ -159,8 +364,7 @@ def _report_linter_exception(filename: Text, lex: linters.LinterException,
                 location.append(f'line={diagnostic.lineno}')
             if diagnostic.col is not None:
                 location.append(f'col={diagnostic.col}')
-            message = diagnostic.message.replace('%', '%25').replace(
-                '\r', '%0D').replace('\n', '%0A')
+            message = diagnostic.message.translate(_GITHUB_ESCAPE_TABLE)
             print((f'::{diagnostic.level} '
                    f'{",".join(location)}::{message}\n'),
                   end='')
@@ -182,8 +386,9 @@ def _report_linter_exception(filename: Text, lex: linters.LinterException,
         if diagnostic.line is not None:
             message_lines.append(f'    {diagnostic.line}')
             if diagnostic.col is not None:
-                prefix = re.sub(r'[^\t]', ' ',
-                                diagnostic.line[:diagnostic.col - 1])
+                prefix = ''.join(
+                    '\t' if c == '\t' else ' '
+                    for c in diagnostic.line[:diagnostic.col - 1])
                 if diagnostic.col_end is not None:
                     arrow = '^' * (diagnostic.col_end - diagnostic.col)
                 else:
@@ -197,41 +402,157 @@ def _report_error(message: Text,
                   diagnostics_output: DiagnosticsOutput) -> None:
     '''Display an error message to the user.'''
     if diagnostics_output == DiagnosticsOutput.GITHUB:
-        message = message.replace('%',
-                                  '%25').replace('\r',
-                                                 '%0D').replace('\n', '%0A')
+        message = message.translate(_GITHUB_ESCAPE_TABLE)
         print(f'::error ::{message}\n', end='')
     else:
         print(f'{git_tools.COLORS.FAIL}{message}{git_tools.COLORS.NORMAL}',
               file=sys.stderr)
 
 
+def _initialize_worker(log_level: int) -> None:
+    '''Sets up logging in a worker process the same way as in the parent.'''
+    logging.basicConfig(level=log_level)
+
+
+class _Executors:
+    '''The executors that are shared by all the linters in a run.
+
+    They are created lazily, so that runs that never need a process pool don't
+    pay for starting one, and runs with many linters only start it once.
+    Closing them also drops the file contents that were cached during the run.
+    '''
+
+    def __init__(self, jobs: int) -> None:
+        self.__jobs = jobs
+        self.__lock = threading.Lock()
+        self.__threads: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.__processes: Optional[
+            concurrent.futures.ProcessPoolExecutor] = None
+
+    def __enter__(self) -> '_Executors':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        for executor in (self.__threads, self.__processes):
+            if executor is not None:
+                executor.shutdown()
+        _FILE_CONTENTS_CACHE.clear()
+
+    def threads(self) -> concurrent.futures.ThreadPoolExecutor:
+        '''Returns the thread pool, which runs at most |jobs| tasks at once.'''
+        with self.__lock:
+            if self.__threads is None:
+                self.__threads = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.__jobs)
+            return self.__threads
+
+    def get(self, linter: linters.Linter,
+            num_files: int) -> concurrent.futures.Executor:
+        '''Returns the executor used to run |linter| against each file.'''
+        # Having more processes than available CPUs would only add context
+        # switches.
+        max_processes = min(self.__jobs, git_tools.available_cpu_count())
+        if (linter.is_subprocess or max_processes <= 1
+                or num_files < _MIN_FILES_FOR_PROCESS_POOL):
+            # Linters that shell out to other binaries spend most of their
+            # time waiting on them, so threads are enough. Small runs are not
+            # worth starting a process pool for.
+            logging.debug('%s: Running with %d threads', linter.name,
+                          self.__jobs)
+            return self.threads()
+        # Pure-Python linters are bound by the GIL, so they need separate
+        # processes to be able to use more than one core.
+        logging.debug('%s: Running with %d processes', linter.name,
+                      max_processes)
+        with self.__lock:
+            if self.__processes is None:
+                # The workers are started from a forkserver, since this can
+                # be called while other threads are running (and possibly
+                # holding locks), and forking would copy them in that state.
+                # The forkserver imports the `__main__` module again, which
+                # is why main() must only be called behind a
+                # `if __name__ == '__main__':` guard.
+                self.__processes = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=max_processes,
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=_initialize_worker,
+                    initargs=(logging.getLogger().getEffectiveLevel(), ))
+            return self.__processes
+
+
+def _split_batches(filenames: Sequence[Text], max_batch_size: int,
+                   jobs: int) -> List[Sequence[Text]]:
+    '''Splits |filenames| into batches of at most |max_batch_size| files.
+
+    The files are spread evenly across |jobs|, since each batch is linted by a
+    single invocation of the underlying tools.
+    '''
+    batch_size = min(max_batch_size, -(-len(filenames) // jobs))
+    return [
+        filenames[i:i + batch_size]
+        for i in range(0, len(filenames), batch_size)
+    ]
+
+
 def _run_linter(
-        args: argparse.Namespace, linter: linters.Linter,
-        filenames: Sequence[Text], validate_only: bool,
+        args: argparse.Namespace, executors: _Executors,
+        linter: linters.Linter, filenames: Sequence[Text], validate_only: bool,
         diagnostics_output: DiagnosticsOutput) -> Tuple[Set[Text], bool]:
     '''Runs the linter against all files.'''
+    # pylint: disable=R0913
     logging.debug('%s: Files to consider: %s', linter.name,
                   ' '.join(filenames))
-    logging.debug('%s: Running with %d threads', linter.name, args.jobs)
-    files = dict((filename, git_tools.file_contents(args, _ROOT, filename))
-                 for filename in filenames)
-    with concurrent.futures.ThreadPoolExecutor(
-            max_workers=args.jobs) as executor:
-        futures = [
-            executor.submit(_run_linter_one, linter, filename, contents,
-                            validate_only, diagnostics_output)
-            for filename, contents in files.items()
-        ]
-        results = [
-            f.result() for f in concurrent.futures.as_completed(futures)
-        ]
-    results.extend(
-        _run_linter_all(args, linter, filenames, validate_only,
-                        diagnostics_output))
-    return (set(violation for violation, _ in results
-                if violation is not None),
-            any(fixable for _, fixable in results))
+    results: List[Tuple[Optional[Text], bool]] = []
+    if linter.supports_one:
+        # Only the commits are needed to read the files, and the full args
+        # (including the list of all files) would otherwise be sent to every
+        # worker process.
+        contents_args = argparse.Namespace(commits=args.commits,
+                                           tool=args.tool)
+        executor = executors.get(linter, len(filenames))
+        # Batching several files per task amortizes the cost of sending the
+        # linter and its results across process boundaries. Thread pools
+        # ignore the chunksize.
+        results = list(
+            executor.map(_run_linter_one,
+                         itertools.repeat(linter),
+                         itertools.repeat(contents_args),
+                         filenames,
+                         itertools.repeat(validate_only),
+                         itertools.repeat(diagnostics_output),
+                         chunksize=max(1,
+                                       len(filenames) // (args.jobs * 4))))
+
+    def _contents_callback(filename: Text) -> bytes:
+        return _file_contents(args, filename)
+
+    if (linter.supports_one or linter.batch_size is None
+            or len(filenames) <= 1):
+        results.extend(
+            _run_linter_all(linter, filenames, _contents_callback,
+                            validate_only, diagnostics_output))
+    else:
+        # Each batch keeps a CPU busy, so there is no point in having more
+        # batches than CPUs. The batches go through the shared thread pool, so
+        # that they don't exceed the number of jobs together with the other
+        # linters.
+        for batch_results in executors.threads().map(
+                _run_linter_all, itertools.repeat(linter),
+                _split_batches(
+                    filenames, linter.batch_size,
+                    min(args.jobs, git_tools.available_cpu_count())),
+                itertools.repeat(_contents_callback),
+                itertools.repeat(validate_only),
+                itertools.repeat(diagnostics_output)):
+            results.extend(batch_results)
+
+    violations: Set[Text] = set()
+    fixable = False
+    for violation, fixable_violation in results:
+        if violation is not None:
+            violations.add(violation)
+        fixable = fixable or fixable_violation
+    return violations, fixable
 
 
 def _get_enabled_linters(
@@ -273,7 +594,12 @@ def _get_enabled_linters(
 
 
 def main() -> None:
-    '''Runs the linters against the chosen files.'''
+    '''Runs the linters against the chosen files.
+
+    Large runs of pure-Python linters use a process pool whose workers import
+    the `__main__` module again, so scripts that wrap this function must only
+    call it behind a `if __name__ == '__main__':` guard.
+    '''
 
     args = git_tools.parse_arguments(
         tool_description='lints a project',
@@ -313,24 +639,35 @@ def main() -> None:
     file_violations: Set[Text] = set()
     fixable = False
 
-    for linter, options in _get_enabled_linters(config, args.config_file,
-                                                args.linters):
-        filtered_files = args.files
-
-        # Filter only the files in the allowlist.
-        allowlist = [re.compile(r) for r in options.get('allowlist', [])]
-        filtered_files = [
-            filename for filename in filtered_files
-            if any(r.match(filename) for r in allowlist)]
-
-        # And not in the denylist.
-        denylist = [re.compile(r) for r in options.get('denylist', [])]
-        filtered_files = [
-            filename for filename in filtered_files
-            if all(not r.match(filename) for r in denylist)]
-        local_violations, local_fixable = _run_linter(
-            args, linter(options), filtered_files,
-            validate_only, args.diagnostics_output)
+    enabled_linters = list(
+        _get_enabled_linters(config, args.config_file, args.linters))
+    by_extension = _index_by_extension(args.files)
+
+    with _Executors(args.jobs) as executors:
+
+        def _run(
+            enabled_linter: Tuple[LinterFactory, Mapping[Text, Any]]
+        ) -> Tuple[Set[Text], bool]:
+            linter, options = enabled_linter
+            return _run_linter(args, executors, linter(options),
+                               _filter_files(args.files, options,
+                                             by_extension),
+                               validate_only, args.diagnostics_output)
+
+        if validate_only and len(enabled_linters) > 1:
+            # Validation does not modify any files, so the linters are
+            # independent of each other and can run concurrently.
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=len(enabled_linters)) as linter_executor:
+                linter_results = list(
+                    linter_executor.map(_run, enabled_linters))
+        else:
+            # Each linter needs to see the fixes made by the previous ones.
+            linter_results = [
+                _run(enabled_linter) for enabled_linter in enabled_linters
+            ]
+
+    for local_violations, local_fixable in linter_results:
         file_violations |= local_violations
         fixable |= local_fixable
 
@@ -5,8 +5,11 @@ from __future__ import print_function
 
 from html.parser import HTMLParser
 import bisect
+import collections
 import dataclasses
-import importlib.util
+import functools
+import hashlib
+import itertools
 import json
 import logging
 import os
@@ -16,10 +19,10 @@ import shlex
 import socket
 import subprocess
 import sys
-import tempfile
 import threading
-from typing import (Any, Callable, Dict, List, Mapping, NamedTuple, Optional,
-                    Pattern, Text, Sequence, Tuple)
+import types
+from typing import (Any, Callable, Dict, Iterable, List, Mapping, NamedTuple,
+                    Optional, Pattern, Text, Sequence, Tuple)
 
 from . import git_tools
 
@@ -33,6 +36,36 @@ def _unicode_whitespace() -> Text:
                     if c != ord('\n')))))[1:-1]
 
 
+@functools.lru_cache(maxsize=1)
+def _unicode_whitespace_validations(
+) -> Sequence[Tuple[Text, Pattern[Text], Text, Sequence[Text]]]:
+    '''Returns the validations used by WhitespaceLinter for text files.
+
+    See WhitespaceLinter._VALIDATIONS for the meaning of each field.
+    '''
+    return [
+        ('Windows-style EOF', re.compile(r'\r\n?'), r'\n', ('\r', )),
+        ('trailing whitespace',
+         re.compile(r'[' + _unicode_whitespace() + r'\u200b\u200c]+\n'),
+         r'\n', ()),
+        ('consecutive empty lines', re.compile(r'\n\n\n+'), r'\n\n',
+         ('\n\n\n', )),
+        ('empty lines after an opening brace', re.compile(r'{\n\n+'), r'{\n',
+         ('{\n\n', )),
+        ('empty lines before a closing brace', re.compile(r'\n+\n(\s*})'),
+         r'\n\1', ('\n\n', )),
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def _unicode_whitespace_search() -> Pattern[Text]:
+    '''Returns a regex that matches wherever any validation would match.'''
+    return re.compile('|'.join(
+        f'(?:{search.pattern})'
+        for _, search, _, _ in _unicode_whitespace_validations()))
+
+
+@functools.lru_cache(maxsize=None)
 def _find_pip_tool(name: Text) -> Text:
     '''Tries to find a pip tool in a few default locations.'''
     for prefix in ['/usr/bin', '/usr/local/bin']:
@@ -42,8 +75,13 @@ def _find_pip_tool(name: Text) -> Text:
     return os.path.join(os.environ['HOME'], '.local/bin', name)
 
 
+@functools.lru_cache(maxsize=None)
 def _which(program: Text) -> Text:
-    '''Looks for |program| in $PATH. Similar to UNIX's `which` command.'''
+    '''Looks for |program| in $PATH. Similar to UNIX's `which` command.
+
+    The result is cached, since it is looked up for every file that is linted.
+    Programs that are not found are not cached.
+    '''
     for path in ['./node_modules/.bin'] + os.environ['PATH'].split(os.pathsep):
         exe_file = os.path.abspath(os.path.join(path.strip('"'), program))
         if os.path.isfile(exe_file) and os.access(exe_file, os.X_OK):
@@ -52,8 +90,11 @@ def _which(program: Text) -> Text:
 
 
 _TIDY_PATH = os.path.join(git_tools.HOOK_TOOLS_ROOT, 'data/tidy')
+_TIDY_ARGS = (_TIDY_PATH, '-q', '-config',
+              os.path.join(git_tools.HOOK_TOOLS_ROOT, 'data/tidy.txt'))
 _PRETTIER_RE = re.compile(r'^(?:[^\s:]+\s*)?[^\s:]+: (.*) \((\d+):(\d+)\)\s*$')
 _DIAGNOSTIC_RE = re.compile(r'^([^:\s]+):(\d+):(\d+): (.*)$')
+_SIMPLE_COMMAND_RE = re.compile(r'[\w./-]+')
 
 Options = Mapping[str, Any]
 ContentsCallback = Callable[[str], bytes]
@@ -122,6 +163,23 @@ class LinterException(Exception):
         return self.__diagnostics
 
 
+def _diagnostic_from_match(match: 're.Match[str]', filename: str,
+                           lines: Sequence[str],
+                           toolname: Optional[str]) -> Diagnostic:
+    '''Creates a Diagnostic from a line of output matched by _DIAGNOSTIC_RE.'''
+    highlighted_line = ''
+    lineno = int(match.group(2))
+    if len(lines) >= lineno:
+        highlighted_line = lines[lineno - 1].rstrip()
+    return Diagnostic(
+        (f'[{toolname}] {match.group(4)}' if toolname else match.group(4)),
+        filename=filename,
+        lineno=lineno,
+        line=highlighted_line,
+        col=int(match.group(3)) or None,
+    )
+
+
 def _process_diagnostics_output(
         filename: str,
         lines: Sequence[str],
@@ -137,22 +195,34 @@ def _process_diagnostics_output(
             # Some diagnostics will refer to other code locations, maybe in
             # other files.
             continue
-        highlighted_line = ''
-        lineno = int(match.group(2))
-        if len(lines) >= lineno:
-            highlighted_line = lines[lineno - 1].rstrip()
         diagnostics.append(
-            Diagnostic(
-                (f'[{toolname}] {match.group(4)}'
-                 if toolname else match.group(4)),
-                filename=filename,
-                lineno=lineno,
-                line=highlighted_line,
-                col=int(match.group(3)) or None,
-            ))
+            _diagnostic_from_match(match, filename, lines, toolname))
     return diagnostics
 
 
+def _process_batch_diagnostics_output(
+        filenames: Mapping[str, str], lines: Mapping[str, Sequence[str]],
+        output: str, toolname: str,
+        diagnostics: Mapping[str, List[Diagnostic]]) -> None:
+    '''Process the output of a tool in standard format for many files.
+
+    |filenames| maps the paths that the tool was run against to the original
+    filenames, and the diagnostics are appended to |diagnostics|.
+    '''
+    for line in output.split('\n'):
+        match = _DIAGNOSTIC_RE.match(line.strip())
+        if not match:
+            continue
+        filename = filenames.get(match.group(1))
+        if filename is None:
+            # Some diagnostics will refer to other code locations, maybe in
+            # other files.
+            continue
+        diagnostics[filename].append(
+            _diagnostic_from_match(match, filename, lines[filename],
+                                   toolname))
+
+
 def _custom_command(command: Text, filename: Text,
                     original_filename: Text) -> List[Text]:
     '''A custom command.'''
@@ -163,57 +233,156 @@ def _custom_command(command: Text, filename: Text,
     ]
 
 
+def _run_custom_command(command: Text, filename: Text,
+                        original_filename: Text) -> None:
+    '''Runs a custom command.
+
+    Raises subprocess.CalledProcessError with the combined stdout and stderr
+    of the command if it fails.
+    '''
+
+    if _SIMPLE_COMMAND_RE.fullmatch(command):
+        # There is nothing for the shell to do, so the command is run
+        # directly, without starting bash first. If it cannot be executed
+        # (e.g. it's a script without a shebang, or it does not exist), bash
+        # gets a chance to run it or to explain why it couldn't.
+        args = [command, filename, original_filename]
+        try:
+            logging.debug('custom_command: Running %s', args)
+            subprocess.run(args,
+                           check=True,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT,
+                           universal_newlines=True)
+            return
+        except OSError:
+            pass
+    args = _custom_command(command, filename, original_filename)
+    logging.debug('custom_command: Running %s', args)
+    subprocess.run(args,
+                   check=True,
+                   stdout=subprocess.PIPE,
+                   stderr=subprocess.STDOUT,
+                   universal_newlines=True)
+
+
+def _prettier_diagnostics(filename: Text, lines: Sequence[Text],
+                          output: Text) -> List[Diagnostic]:
+    '''Parses the errors that prettier reported for |filename|.'''
+    diagnostics: List[Diagnostic] = []
+    for line in output.strip().split('\n'):
+        match = _PRETTIER_RE.match(line)
+        if not match:
+            continue
+        diagnostics.append(
+            Diagnostic(
+                f'{match.group(1)}',
+                filename=filename,
+                lineno=int(match.group(2)),
+                line=lines[int(match.group(2)) - 1].rstrip(),
+                col=int(match.group(3)) or None,
+            ))
+    return diagnostics
+
+
+_PRETTIER_CACHE_SIZE = 64
+_PrettierCacheKey = Tuple[bytes, Tuple[Text, ...]]
+_PRETTIER_CACHE: 'collections.OrderedDict[_PrettierCacheKey, bytes]' = (
+    collections.OrderedDict())
+_PRETTIER_CACHE_LOCK = threading.Lock()
+
+
+def _run_prettier(contents: bytes, args: Tuple[Text, ...]) -> bytes:
+    '''Runs prettier with |args| on |contents| and returns the result.
+
+    The result only depends on |contents| and |args|, so the last few results
+    are cached by a digest of |contents|: files with the same contents (like
+    generated code) are only formatted once, without keeping every input
+    alive. Failures raise subprocess.CalledProcessError, and are never cached.
+    '''
+    key = (hashlib.sha256(contents).digest(), args)
+    with _PRETTIER_CACHE_LOCK:
+        if key in _PRETTIER_CACHE:
+            _PRETTIER_CACHE.move_to_end(key)
+            return _PRETTIER_CACHE[key]
+    prettier_args = [
+        _which('prettier'), '--single-quote', '--trailing-comma=all',
+        '--no-config', *args
+    ]
+    logging.debug('lint_prettier: Running %s', prettier_args)
+    result = subprocess.run(prettier_args,
+                            input=contents,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            check=False,
+                            cwd=git_tools.HOOK_TOOLS_ROOT)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode,
+                                            prettier_args,
+                                            output=result.stdout,
+                                            stderr=result.stderr)
+    with _PRETTIER_CACHE_LOCK:
+        _PRETTIER_CACHE[key] = result.stdout
+        if len(_PRETTIER_CACHE) > _PRETTIER_CACHE_SIZE:
+            _PRETTIER_CACHE.popitem(last=False)
+    return result.stdout
+
+
 def _lint_javascript(filename: Text,
                      contents: bytes,
                      extra_commands: Optional[Sequence[Text]] = None) -> bytes:
     '''Runs prettier on |contents|.'''
 
     lines = contents.decode('utf-8').split('\n')
-    with tempfile.NamedTemporaryFile(suffix='.js') as js_out:
-        # Keep the shebang unmodified.
-        header = b''
-        if contents.startswith(b'#!'):
-            header, contents = contents.split(b'\n', 1)
-            header += b'\n'
+    # Keep the shebang unmodified.
+    header_end = 0
+    if contents.startswith(b'#!'):
+        header_end = contents.find(b'\n') + 1 or len(contents)
+    header = contents[:header_end]
+
+    if not extra_commands:
+        # Without any extra commands that need a file, the contents can be
+        # piped through prettier. The parser is the one that prettier would
+        # infer for a .js file, regardless of the actual extension.
+        try:
+            return header + _run_prettier(
+                contents[header_end:],
+                ('--parser=babel',
+                 f'--stdin-filepath={os.path.basename(filename)}'))
+        except subprocess.CalledProcessError as cpe:
+            raise LinterException(
+                'JavaScript lint errors',
+                fixable=False,
+                diagnostics=_prettier_diagnostics(
+                    filename, lines,
+                    cpe.stderr.decode('utf-8', errors='replace'))) from cpe
 
-        js_out.write(contents)
+    # Extra commands might not always produce the same output, so this is
+    # never cached.
+    import tempfile  # pylint: disable=import-outside-toplevel
+    with tempfile.NamedTemporaryFile(suffix='.js') as js_out:
+        # The body is written straight from |contents|, without copying it.
+        js_out.write(memoryview(contents)[header_end:])
         js_out.flush()
 
-        commands = [
-            [
-                _which('prettier'), '--single-quote', '--trailing-comma=all',
-                '--no-config', '--write', js_out.name
-            ],
-        ] + [
-            _custom_command(command, js_out.name, filename)
-            for command in (extra_commands or [])
+        args = [
+            _which('prettier'), '--single-quote', '--trailing-comma=all',
+            '--no-config', '--write', js_out.name
         ]
-
-        for args in commands:
-            try:
-                logging.debug('lint_javascript: Running %s', args)
-                subprocess.run(args,
-                               check=True,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.STDOUT,
-                               universal_newlines=True)
-            except subprocess.CalledProcessError as cpe:
-                diagnostics: List[Diagnostic] = []
-                for line in cpe.output.strip().split('\n'):
-                    match = _PRETTIER_RE.match(line)
-                    if not match:
-                        continue
-                    diagnostics.append(
-                        Diagnostic(
-                            f'{match.group(1)}',
-                            filename=filename,
-                            lineno=int(match.group(2)),
-                            line=lines[int(match.group(2)) - 1].rstrip(),
-                            col=int(match.group(3)) or None,
-                        ))
-                raise LinterException('JavaScript lint errors',
-                                      fixable=False,
-                                      diagnostics=diagnostics) from cpe
+        try:
+            logging.debug('lint_javascript: Running %s', args)
+            subprocess.run(args,
+                           check=True,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT,
+                           universal_newlines=True)
+            for command in extra_commands:
+                _run_custom_command(command, js_out.name, filename)
+        except subprocess.CalledProcessError as cpe:
+            raise LinterException('JavaScript lint errors',
+                                  fixable=False,
+                                  diagnostics=_prettier_diagnostics(
+                                      filename, lines, cpe.output)) from cpe
 
         with open(js_out.name, 'rb') as js_in:
             return header + js_in.read()
@@ -222,12 +391,8 @@ def _lint_javascript(filename: Text,
 def _lint_html(contents: bytes, strict: bool) -> bytes:
     '''Runs tidy on |contents|.'''
 
-    args = [
-        _TIDY_PATH, '-q', '-config',
-        os.path.join(git_tools.HOOK_TOOLS_ROOT, 'data/tidy.txt')
-    ]
-    logging.debug('lint_html: Running %s', args)
-    result = subprocess.run(args,
+    logging.debug('lint_html: Running %s', _TIDY_ARGS)
+    result = subprocess.run(_TIDY_ARGS,
                             input=contents,
                             stdout=subprocess.PIPE,
                             stderr=subprocess.PIPE,
@@ -245,40 +410,20 @@ def _lint_html(contents: bytes, strict: bool) -> bytes:
 
 def _lint_prettier(contents: bytes, filename: Text) -> bytes:
     '''Runs prettier on |contents| .'''
-    args = [
-        _which('prettier'), '--single-quote', '--trailing-comma=all',
-        '--no-config',
-        f'--stdin-filepath={filename}'
-    ]
-    logging.debug('lint_prettier: Running %s', args)
-    result = subprocess.run(args,
-                            input=contents,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            check=False,
-                            cwd=git_tools.HOOK_TOOLS_ROOT)
-
-    if result.returncode != 0:
-        lines = contents.decode('utf-8').split('\n')
-        diagnostics: List[Diagnostic] = []
-        for line in result.stderr.decode('utf-8',
-                                         errors='replace').strip().split('\n'):
-            match = _PRETTIER_RE.match(line)
-            if not match:
-                continue
-            diagnostics.append(
-                Diagnostic(
-                    f'{match.group(1)}',
-                    filename=filename,
-                    lineno=int(match.group(2)),
-                    line=lines[int(match.group(2)) - 1].rstrip(),
-                    col=int(match.group(3)) or None,
-                ))
-        raise LinterException('lint errors',
-                              fixable=False,
-                              diagnostics=diagnostics)
-
-    return result.stdout
+    # Only the name of the file is passed, so that prettier infers the same
+    # parser, while still allowing files in different directories to share
+    # the cached result.
+    try:
+        return _run_prettier(
+            contents, (f'--stdin-filepath={os.path.basename(filename)}', ))
+    except subprocess.CalledProcessError as cpe:
+        raise LinterException(
+            'lint errors',
+            fixable=False,
+            diagnostics=_prettier_diagnostics(
+                filename,
+                contents.decode('utf-8').split('\n'),
+                cpe.stderr.decode('utf-8', errors='replace'))) from cpe
 
 
 def _lint_stylelint(contents: bytes, filename: Text) -> bytes:
@@ -341,9 +486,28 @@ class Linter:
     '''An abstract Linter.'''
     # pylint: disable=R0903
 
+    # Whether this linter spends most of its time running external programs.
+    # Linters that don't are run in separate processes, and must be picklable.
+    is_subprocess = True
+
+    # The maximum number of files that run_all() should be given at once, for
+    # linters that don't support run_one(). If set, the files are split into
+    # batches of at most this size, which are linted concurrently.
+    batch_size: Optional[int] = None
+
     def __init__(self) -> None:
         pass
 
+    @property
+    def supports_one(self) -> bool:
+        '''Whether this linter implements run_one().
+
+        Linters that only implement run_all() should return False (or simply
+        set `supports_one = False` in the class) to avoid reading every file
+        upfront.
+        '''
+        return True
+
     def run_one(self, filename: str, contents: bytes) -> SingleResult:
         '''Runs the linter against |contents|.'''
         del filename  # unused
@@ -482,30 +646,37 @@ class WhitespaceLinter(Linter):
     '''Removes annoying superfluous whitespace.'''
     # pylint: disable=R0903
 
+    is_subprocess = False
+
+    # Each validation is a description, the regex to search for, its
+    # replacement, and literal substrings (at least one of which must be
+    # present for the regex to match). Checking for the substrings is much
+    # cheaper than running the regex. An empty list means there are no
+    # such substrings.
     _VALIDATIONS = [
-        ('Windows-style EOF', re.compile(br'\r\n?'), br'\n'),
-        ('trailing whitespace', re.compile(br'[ \t\r\f\v]+\n'), br'\n'),
-        ('consecutive empty lines', re.compile(br'\n\n\n+'), br'\n\n'),
+        ('Windows-style EOF', re.compile(br'\r\n?'), br'\n', (b'\r', )),
+        ('trailing whitespace', re.compile(br'[ \t\r\f\v]+\n'), br'\n',
+         (b' \n', b'\t\n', b'\r\n', b'\f\n', b'\v\n')),
+        ('consecutive empty lines', re.compile(br'\n\n\n+'), br'\n\n',
+         (b'\n\n\n', )),
         ('empty lines after an opening brace', re.compile(br'{\n\n+'),
-         br'{\n'),
+         br'{\n', (b'{\n\n', )),
         ('empty lines before a closing brace', re.compile(br'\n+\n(\s*})'),
-         br'\n\1'),
+         br'\n\1', (b'\n\n', )),
     ]
 
-    _UNICODE_VALIDATIONS = [
-        ('Windows-style EOF', re.compile(r'\r\n?'), r'\n'),
-        ('trailing whitespace',
-         re.compile(r'[' + _unicode_whitespace() + r'\u200b\u200c]+\n'),
-         r'\n'),
-        ('consecutive empty lines', re.compile(r'\n\n\n+'), r'\n\n'),
-        ('empty lines after an opening brace', re.compile(r'{\n\n+'), r'{\n'),
-        ('empty lines before a closing brace', re.compile(r'\n+\n(\s*})'),
-         r'\n\1'),
-    ]
+    # Matches wherever any of the validations would match. Most files are
+    # clean, and this lets them be checked with a single scan.
+    _SEARCH = re.compile(b'|'.join(b'(?:' + search.pattern + b')'
+                                   for _, search, _, _ in _VALIDATIONS))
 
     def __init__(self, options: Optional[Options] = None) -> None:
         super().__init__()
         del options
+        # Building the validations is expensive, so it's only done once a
+        # WhitespaceLinter is actually needed.
+        self.__unicode_validations = _unicode_whitespace_validations()
+        self.__unicode_search = _unicode_whitespace_search()
 
     def run_one(self, filename: str, contents: bytes) -> SingleResult:
         '''Runs all validations against |files|.
@@ -515,14 +686,20 @@ class WhitespaceLinter(Linter):
         content is not identical to the original.  The contents of the files
         will be presented as a single string, allowing for multi-line matches.
         '''
-        violations = []
+        violations: List[Text] = []
 
         # Run all validations sequentially, so all violations can be fixed
         # together.
         try:
             unicode_contents = contents.decode('utf-8')
-            for (error_string, unicode_search,
-                 unicode_replace) in WhitespaceLinter._UNICODE_VALIDATIONS:
+            if not self.__unicode_search.search(unicode_contents):
+                return SingleResult(contents, violations)
+            for (error_string, unicode_search, unicode_replace,
+                 unicode_triggers) in self.__unicode_validations:
+                if unicode_triggers and not any(
+                        trigger in unicode_contents
+                        for trigger in unicode_triggers):
+                    continue
                 unicode_replaced = unicode_search.sub(unicode_replace,
                                                       unicode_contents)
                 if unicode_replaced != unicode_contents:
@@ -530,7 +707,13 @@ class WhitespaceLinter(Linter):
                     unicode_contents = unicode_replaced
             contents = unicode_contents.encode('utf-8')
         except UnicodeDecodeError:
-            for error_string, search, replace in WhitespaceLinter._VALIDATIONS:
+            if not WhitespaceLinter._SEARCH.search(contents):
+                return SingleResult(contents, violations)
+            for (error_string, search, replace,
+                 triggers) in WhitespaceLinter._VALIDATIONS:
+                if triggers and not any(trigger in contents
+                                        for trigger in triggers):
+                    continue
                 replaced = search.sub(replace, contents)
                 if replaced != contents:
                     violations.append(error_string)
@@ -547,6 +730,8 @@ class ProblematicTermsLinter(Linter):
     '''Warns if there are problematic terms in the codebase.'''
     # pylint: disable=R0903
 
+    is_subprocess = False
+
     def __init__(self, options: Optional[Options] = None) -> None:
         super().__init__()
         self.__terms: List[ProblematicTerm] = []
@@ -621,6 +806,23 @@ class ProblematicTermsLinter(Linter):
         return 'problematic_terms'
 
 
+class _OpenTag(NamedTuple):
+    '''A tag that VueHTMLParser has seen the start of, but not the end.'''
+    tag: Text
+    attrs: List[Tuple[str, Optional[str]]]
+    starttag: Text
+    start: Tuple[int, int]
+
+
+class _Tag(NamedTuple):
+    '''A top-level tag in a .vue file, with its start and end positions.'''
+    tag: Text
+    attrs: List[Tuple[str, Optional[str]]]
+    starttag: Text
+    start: Tuple[int, int]
+    end: Tuple[int, int]
+
+
 class VueHTMLParser(HTMLParser):
     '''A parser that can understand .vue template files.'''
 
@@ -628,10 +830,8 @@ class VueHTMLParser(HTMLParser):
 
     def __init__(self) -> None:
         super().__init__()
-        self._stack: List[Tuple[Text, List[Tuple[str, Optional[str]]], Text,
-                                Tuple[int, int]]] = []
-        self._tags: List[Tuple[Text, List[Tuple[str, Optional[str]]], str,
-                               Tuple[int, int], Tuple[int, int]]] = []
+        self._stack: List[_OpenTag] = []
+        self._tags: List[_Tag] = []
         self._id_linter_enabled = True
         self.diagnostics: List[Diagnostic] = []
         self._lines: List[str] = []
@@ -653,23 +853,32 @@ class VueHTMLParser(HTMLParser):
         self._lines = contents.split('\n')
         self.feed(contents)
 
+        # The offset in |contents| where each line starts, so that the
+        # sections can be sliced directly out of it.
+        line_offsets = list(
+            itertools.accumulate((len(line) + 1 for line in self._lines),
+                                 initial=0))
         sections = []
         for tag, attrs, starttag, start, end in self._tags:
-            line_range = []
-            if len(self._lines[start[0]]) > len(starttag) + start[1]:
-                line_range.append(self._lines[start[0]][len(starttag)
-                                                        + start[1]:])
-            line_range += self._lines[start[0] + 1:end[0]]
-            if end[1] > 0:
-                line_range.append(self._lines[end[0]][:end[1]])
-            sections.append((tag, attrs, starttag, '\n'.join(line_range)))
+            # The section starts right after the start tag, or in the next
+            # line if the start tag is the last thing in its line.
+            begin = line_offsets[start[0]] + start[1] + len(starttag)
+            if contents.startswith('\n', begin):
+                begin += 1
+            # The section ends right before the end tag, without the newline
+            # that precedes it if the end tag is the first thing in its line.
+            finish = line_offsets[end[0]] + end[1]
+            if end[1] == 0:
+                finish -= 1
+            sections.append((tag, attrs, starttag, contents[begin:finish]))
         return sections
 
     def handle_starttag(self, tag: Text,
                         attrs: List[Tuple[Text, Optional[Text]]]) -> None:
         line, col = self.getpos()
-        self._stack.append((tag, attrs, str(self.get_starttag_text()),
-                            (line - 1, col)))
+        self._stack.append(
+            _OpenTag(tag, attrs, str(self.get_starttag_text()),
+                     (line - 1, col)))
         if not self._id_linter_enabled:
             return
         for name, _ in attrs:
@@ -683,9 +892,9 @@ class VueHTMLParser(HTMLParser):
                         col=col + 1))
 
     def handle_endtag(self, tag: Text) -> None:
-        while self._stack and self._stack[-1][0] != tag:
+        while self._stack and self._stack[-1].tag != tag:
             self._stack.pop()
-        if not self._stack or self._stack[-1][0] != tag:
+        if not self._stack or self._stack[-1].tag != tag:
             line, col = self.getpos()
             self.diagnostics.append(
                 Diagnostic('Unclosed tag',
@@ -697,7 +906,8 @@ class VueHTMLParser(HTMLParser):
         _, attrs, starttag, begin = self._stack.pop()
         if not self._stack:
             line, col = self.getpos()
-            self._tags.append((tag, attrs, starttag, begin, (line - 1, col)))
+            self._tags.append(
+                _Tag(tag, attrs, starttag, begin, (line - 1, col)))
 
     def handle_comment(self, data: Text) -> None:
         if data.find('id-lint ') < 0:
@@ -868,65 +1078,149 @@ class PHPLinter(Linter):
         return 'php'
 
 
+def _stage_files(directory: str, files: Mapping[str, bytes]) -> Dict[str, str]:
+    '''Writes |files| into |directory|.
+
+    Each file is written under its path relative to the root of the
+    repository, so that tools see the same package layout (and therefore the
+    same module names) as in the original tree. Returns a mapping of the
+    written paths to the original filenames.
+    '''
+    paths: Dict[str, str] = {}
+    for filename, contents in files.items():
+        relative_path = os.path.normpath(filename).lstrip(os.sep)
+        if relative_path.split(os.sep, 1)[0] == os.pardir:
+            # Files outside of the repository can't be placed alongside the
+            # rest, so they get a directory of their own.
+            relative_path = os.path.join('external', str(len(paths)),
+                                         os.path.basename(filename))
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as outfile:
+            outfile.write(contents)
+        paths[path] = filename
+    return paths
+
+
 class PythonLinter(Linter):
     '''Runs pycodestyle, pylint, and Mypy.'''
 
     # pylint: disable=R0903
 
+    # The maximum number of files that the driver passes to a single run_all()
+    # call, and therefore to a single pycodestyle or pylint invocation.
+    batch_size = 128
+
     def __init__(self, options: Optional[Options] = None) -> None:
         super().__init__()
         self.__options = options or {}
 
-    def run_one(self, filename: str, contents: bytes) -> SingleResult:
-        diagnostics: List[Diagnostic] = []
-        lines = contents.decode('utf-8').split('\n')
-        with tempfile.TemporaryDirectory(prefix='python_linter_') as tmpdir:
-            tmp_path = os.path.join(tmpdir, os.path.basename(filename))
-            with open(tmp_path, 'wb') as pyfile:
-                pyfile.write(contents)
+    @property
+    def supports_one(self) -> bool:
+        '''Whether the files are linted one at a time.
 
-            python3 = _which('python3')
+        Mypy is run against the files in the repository, so it still needs to
+        be run once per file. Otherwise, the files are linted in batches by
+        run_all() to avoid starting the Python interpreter for each file.
+        '''
+        return bool(self.__options.get('mypy', False))
 
-            args = [
-                python3, '-m', 'pycodestyle',
-                '--format=%(path)s:%(row)d:%(col)d: %(code)s %(text)s',
-                tmp_path
-            ]
-            for configname in ('pycodestyle_config', 'pep8_config'):
-                if configname not in self.__options:
-                    continue
-                args.append(f'--config={self.__options[configname]}')
-                break
-            try:
-                logging.debug('lint_python: Running %s', args)
-                subprocess.run(args,
-                               check=True,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.STDOUT,
-                               universal_newlines=True)
-            except subprocess.CalledProcessError as cpe:
-                diagnostics.extend(
-                    _process_diagnostics_output(filename,
-                                                lines,
-                                                cpe.output.strip(),
-                                                toolname='pycodestyle'))
+    def _pycodestyle_args(self, paths: Iterable[str]) -> List[str]:
+        '''Returns the pycodestyle command line to lint |paths|.'''
+        args = [
+            _which('python3'), '-m', 'pycodestyle',
+            '--format=%(path)s:%(row)d:%(col)d: %(code)s %(text)s'
+        ]
+        for configname in ('pycodestyle_config', 'pep8_config'):
+            if configname not in self.__options:
+                continue
+            args.append(f'--config={self.__options[configname]}')
+            break
+        args.extend(paths)
+        return args
+
+    def _pylint_args(self, paths: Iterable[str]) -> List[str]:
+        '''Returns the pylint command line to lint |paths|.'''
+        # We need to disable import-error/no-name-in-module since the file
+        # won't be checked in the repository, but in a temporary directory.
+        # duplicate-code and cyclic-import would only ever be reported
+        # because the files are linted together.
+        args = [
+            _which('python3'),
+            '-m',
+            'pylint',
+            '--output-format=text',
+            ('--msg-template={abspath}:{line}:{column}: '
+             '{msg_id}({symbol}) {msg}'),
+            '--reports=no',
+            '--disable=import-error',
+            '--disable=no-name-in-module',
+            '--disable=duplicate-code',
+            '--disable=cyclic-import',
+        ]
+        if 'pylint_config' in self.__options:
+            args.append(f'--rcfile={self.__options["pylint_config"]}')
+        args.extend(paths)
+        return args
+
+    def _lint_files(
+            self,
+            files: Mapping[str, bytes]) -> Mapping[str, List[Diagnostic]]:
+        '''Runs pycodestyle and pylint once against all of |files|.'''
+        diagnostics: Dict[str, List[Diagnostic]] = {
+            filename: []
+            for filename in files
+        }
+        lines = {
+            filename: contents.decode('utf-8').split('\n')
+            for filename, contents in files.items()
+        }
+        import tempfile  # pylint: disable=import-outside-toplevel
+        with tempfile.TemporaryDirectory(prefix='python_linter_') as tmpdir:
+            tmp_paths = _stage_files(tmpdir, files)
+
+            # pycodestyle and pylint are independent of each other, so
+            # pycodestyle runs in the background while pylint runs.
+            pycodestyle_args = self._pycodestyle_args(tmp_paths)
+            pylint_args = self._pylint_args(tmp_paths)
+            logging.debug('lint_python: Running %s', pycodestyle_args)
+            with subprocess.Popen(pycodestyle_args,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT,
+                                  universal_newlines=True) as pycodestyle:
+                logging.debug('lint_python: Running %s', pylint_args)
+                pylint = subprocess.run(pylint_args,
+                                        check=False,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        universal_newlines=True)
+                pycodestyle_output, _ = pycodestyle.communicate()
+
+        if pycodestyle.returncode != 0:
+            _process_batch_diagnostics_output(tmp_paths, lines,
+                                              pycodestyle_output.strip(),
+                                              'pycodestyle', diagnostics)
+        if pylint.returncode != 0:
+            _process_batch_diagnostics_output(tmp_paths, lines,
+                                              pylint.stdout.strip(), 'pylint',
+                                              diagnostics)
+
+        return diagnostics
+
+    def run_one(self, filename: str, contents: bytes) -> SingleResult:
+        diagnostics = list(self._lint_files({filename: contents})[filename])
 
-            # We need to disable import-error/no-name-in-module since the file
-            # won't be checked in the repository, but in a temporary directory.
+        if self.__options.get('mypy', False):
             args = [
-                python3,
+                _which('python3'),
                 '-m',
-                'pylint',
-                '--output-format=text',
-                ('--msg-template={abspath}:{line}:{column}: '
-                 '{msg_id}({symbol}) {msg}'),
-                '--reports=no',
-                '--disable=import-error',
-                '--disable=no-name-in-module',
-                tmp_path,
+                'mypy',
+                '--show-column-numbers',
+                '--strict',
+                '--no-incremental',
+                '--follow-imports=silent',
+                filename,
             ]
-            if 'pylint_config' in self.__options:
-                args.append(f'--rcfile={self.__options["pylint_config"]}')
             try:
                 logging.debug('lint_python: Running %s', args)
                 subprocess.run(args,
@@ -936,35 +1230,11 @@ class PythonLinter(Linter):
                                universal_newlines=True)
             except subprocess.CalledProcessError as cpe:
                 diagnostics.extend(
-                    _process_diagnostics_output(filename,
-                                                lines,
-                                                cpe.output.strip(),
-                                                toolname='pylint'))
-
-            if self.__options.get('mypy', False):
-                args = [
-                    _which('python3'),
-                    '-m',
-                    'mypy',
-                    '--show-column-numbers',
-                    '--strict',
-                    '--no-incremental',
-                    '--follow-imports=silent',
-                    filename,
-                ]
-                try:
-                    logging.debug('lint_python: Running %s', args)
-                    subprocess.run(args,
-                                   check=True,
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.STDOUT,
-                                   universal_newlines=True)
-                except subprocess.CalledProcessError as cpe:
-                    diagnostics.extend(
-                        _process_diagnostics_output(filename,
-                                                    lines,
-                                                    cpe.output.strip(),
-                                                    toolname='mypy'))
+                    _process_diagnostics_output(
+                        filename,
+                        contents.decode('utf-8').split('\n'),
+                        cpe.output.strip(),
+                        toolname='mypy'))
 
         if diagnostics:
             diagnostics.sort(key=lambda d: d.lineno or 0)
@@ -973,6 +1243,28 @@ class PythonLinter(Linter):
                                   diagnostics=diagnostics)
         return SingleResult(contents, [])
 
+    def run_all(self, filenames: Sequence[str],
+                contents_callback: ContentsCallback) -> MultipleResults:
+        if self.supports_one or not filenames:
+            return super().run_all(filenames, contents_callback)
+
+        # The driver already splits the files into batches of at most
+        # |batch_size|, so all of them are linted at once.
+        diagnostics = self._lint_files(
+            {filename: contents_callback(filename)
+             for filename in filenames})
+
+        all_diagnostics: List[Diagnostic] = []
+        for filename in filenames:
+            all_diagnostics.extend(
+                sorted(diagnostics[filename], key=lambda d: d.lineno or 0))
+        if all_diagnostics:
+            raise LinterException('Python lint errors',
+                                  fixable=False,
+                                  diagnostics=all_diagnostics)
+        # Nothing is ever fixed, so no contents need to be returned.
+        return super().run_all(filenames, contents_callback)
+
     @property
     def name(self) -> Text:
         return 'python'
@@ -988,6 +1280,7 @@ class ClangFormatLinter(Linter):
         del options
 
     def run_one(self, filename: str, contents: bytes) -> SingleResult:
+        import tempfile  # pylint: disable=import-outside-toplevel
         with tempfile.TemporaryDirectory(
                 prefix='clang_format_linter_') as tmpdir:
             tmp_path = os.path.join(tmpdir, os.path.basename(filename))
@@ -1117,6 +1410,32 @@ class EslintLinter(Linter):
         return 'eslint'
 
 
+_CUSTOM_LINTER_MODULES: Dict[Text, types.ModuleType] = {}
+_CUSTOM_LINTER_MODULES_LOCK = threading.Lock()
+
+
+def _load_custom_linter_module(module_path: Text) -> types.ModuleType:
+    '''Loads the module at |module_path|, executing it at most once.
+
+    Several custom linters can be defined in the same module, and they all
+    share it.
+    '''
+    with _CUSTOM_LINTER_MODULES_LOCK:
+        if module_path in _CUSTOM_LINTER_MODULES:
+            return _CUSTOM_LINTER_MODULES[module_path]
+        import importlib.util  # pylint: disable=import-outside-toplevel
+        custom_linter_module_spec = importlib.util.spec_from_file_location(
+            module_path.rstrip('.py').replace('/', '_'), module_path)
+        if custom_linter_module_spec is None:
+            raise RuntimeError(f'Cannot find module {module_path!r}')
+        custom_linter_module = importlib.util.module_from_spec(
+            custom_linter_module_spec)
+        custom_linter_module_spec.loader.exec_module(  # type: ignore
+            custom_linter_module)
+        _CUSTOM_LINTER_MODULES[module_path] = custom_linter_module
+        return custom_linter_module
+
+
 class CustomLinter(Linter):
     '''A lazily, dynamically-loaded linter.'''
 
@@ -1133,15 +1452,7 @@ class CustomLinter(Linter):
     def _instance(self) -> Linter:
         if self.__instance is not None:
             return self.__instance
-        custom_linter_module_spec = importlib.util.spec_from_file_location(
-            self.__module_path.rstrip('.py').replace('/', '_'),
-            self.__module_path)
-        if custom_linter_module_spec is None:
-            raise RuntimeError(f'Cannot find module {self.__module_path!r}')
-        custom_linter_module = importlib.util.module_from_spec(
-            custom_linter_module_spec)
-        custom_linter_module_spec.loader.exec_module(  # type: ignore
-            custom_linter_module)
+        custom_linter_module = _load_custom_linter_module(self.__module_path)
         self.__instance = getattr(custom_linter_module,
                                   self.__config['class_name'])(self.__options)
         return self.__instance
@@ -1165,6 +1476,11 @@ class CustomLinter(Linter):
             '_CustomLinter__instance': None,
         }
 
+    @property
+    def supports_one(self) -> bool:
+        '''Whether the underlying linter implements run_one().'''
+        return self._instance.supports_one
+
     def run_one(self, filename: str, contents: bytes) -> SingleResult:
         return self._instance.run_one(filename, contents)
 
@@ -1188,23 +1504,14 @@ class CommandLinter(Linter):
 
     def run_one(self, filename: str, contents: bytes) -> SingleResult:
         extension = os.path.splitext(filename)[1]
+        import tempfile  # pylint: disable=import-outside-toplevel
         with tempfile.NamedTemporaryFile(suffix=extension) as tmp:
             tmp.write(contents)
             tmp.flush()
 
-            commands = [
-                _custom_command(command, tmp.name, filename)
-                for command in self.__options.get('commands', [])
-            ]
-
-            for args in commands:
+            for command in self.__options.get('commands', []):
                 try:
-                    logging.debug('lint_command: Running %s', args)
-                    subprocess.run(args,
-                                   check=True,
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.STDOUT,
-                                   universal_newlines=True)
+                    _run_custom_command(command, tmp.name, filename)
                 except subprocess.CalledProcessError as cpe:
                     raise LinterException(cpe.output, fixable=False) from cpe
 
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+
+"""Wrapper around lint.main() that always uses a process pool."""
+
+
+from omegaup_hook_tools import git_tools, lint
+
+
+def main() -> None:
+    """Main entrypoint."""
+
+    # pylint: disable=protected-access
+    lint._MIN_FILES_FOR_PROCESS_POOL = 1
+    git_tools.available_cpu_count = lambda: 2
+    lint.main()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
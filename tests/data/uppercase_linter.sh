@@ -0,0 +1,5 @@
+# Trivial linter that converts to uppercase. It deliberately has no shebang,
+# so it is run by bash.
+
+contents="$(cat "$1")"
+printf '%s\n' "${contents^^}" > "$1"
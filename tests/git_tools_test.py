@@ -5,6 +5,9 @@
 
 from __future__ import print_function
 
+import argparse
+import io
+import subprocess
 import unittest
 
 from omegaup_hook_tools import git_tools
@@ -32,6 +35,47 @@ class TestGitTools(unittest.TestCase):
             files = git_tools.get_explicit_file_list(commits)
             self.assertEqual((commits, files), expected)
 
+    def test_iter_nul_tokens(self) -> None:
+        """Tests git_tools._iter_nul_tokens()."""
+
+        for data, expected in [
+                (b'', []),
+                (b'foo\x00', [b'foo']),
+                (b'foo\x00bar', [b'foo', b'bar']),
+                (b'foo\x00\x00bar\x00', [b'foo', b'', b'bar']),
+                (b'x' * 100000 + b'\x00y\x00', [b'x' * 100000, b'y']),
+        ]:
+            self.assertEqual(
+                list(git_tools._iter_nul_tokens(  # pylint: disable=W0212
+                    io.BytesIO(data))),
+                expected)
+
+    def test_file_contents(self) -> None:
+        """Tests git_tools.file_contents() between two commits."""
+
+        root = git_tools.root_dir()
+        args = argparse.Namespace(commits=['HEAD', 'HEAD'])
+        for filename in ('LICENSE', 'README.md', 'LICENSE'):
+            self.assertEqual(
+                git_tools.file_contents(args, root, filename),
+                subprocess.run(['/usr/bin/git', 'show', f'HEAD:{filename}'],
+                               check=True,
+                               stdout=subprocess.PIPE,
+                               cwd=root).stdout)
+        # Missing paths (even with spaces) and objects that are not files
+        # are not found, and don't confuse later reads.
+        for filename in ('does-not-exist', 'does-not exist', 'src',
+                         'src/'):
+            with self.subTest(filename=filename):
+                with self.assertRaises(FileNotFoundError):
+                    git_tools.file_contents(args, root, filename)
+        self.assertEqual(
+            git_tools.file_contents(args, root, 'LICENSE'),
+            subprocess.run(['/usr/bin/git', 'show', 'HEAD:LICENSE'],
+                           check=True,
+                           stdout=subprocess.PIPE,
+                           cwd=root).stdout)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Unit tests for lint."""
+
+from __future__ import print_function
+
+import concurrent.futures
+import json
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import Dict, List, Tuple
+
+from omegaup_hook_tools import lint, linters
+
+
+class TestLint(unittest.TestCase):
+    """Tests lint."""
+
+    def test_filter_files(self) -> None:
+        """Tests lint._filter_files()."""
+
+        # Not sorted, since the order of the files must be preserved.
+        filenames = [
+            'foo.py', 'README', 'third_party/qux.py', 'foo.js', 'bar/baz.py'
+        ]
+        cases: List[Tuple[Dict[str, List[str]], Tuple[str, ...]]] = [
+            # No allowlist means no files.
+            ({}, ()),
+            ({'allowlist': []}, ()),
+            ({'denylist': [r'.*\.js$']}, ()),
+
+            # Allowlist only.
+            ({'allowlist': [r'.*\.py$']},
+             ('foo.py', 'third_party/qux.py', 'bar/baz.py')),
+            ({'allowlist': [r'.*\.py$', r'.*\.js$']},
+             ('foo.py', 'third_party/qux.py', 'foo.js', 'bar/baz.py')),
+
+            # Allowlist and denylist.
+            ({'allowlist': [r'.*\.py$'], 'denylist': [r'third_party/']},
+             ('foo.py', 'bar/baz.py')),
+            ({'allowlist': [r'.*'], 'denylist': [r'bar/', r'.*\.js$']},
+             ('foo.py', 'README', 'third_party/qux.py')),
+
+            # Patterns with inline flags cannot be joined with others.
+            ({'allowlist': [r'.*\.js$', r'(?i).*\.PY$'],
+              'denylist': [r'bar/', r'(?i)THIRD_PARTY/']},
+             ('foo.py', 'foo.js')),
+        ]
+        for options, expected in cases:
+            self.assertEqual(
+                lint._filter_files(  # pylint: disable=protected-access
+                    filenames, options),
+                expected)
+            self.assertEqual(
+                lint._filter_files(  # pylint: disable=protected-access
+                    filenames, options,
+                    lint._index_by_extension(  # pylint: disable=W0212
+                        filenames)),
+                expected)
+
+    def test_compile_patterns(self) -> None:
+        """Tests lint._compile_patterns()."""
+
+        for patterns, filename, expected in [
+                ((r'.*\.txt$', r'(?i).*\.MD$'), 'README.md', True),
+                ((r'.*\.txt$', r'(?i).*\.MD$'), 'README.rst', False),
+                ((r'(?P<x>a).*', r'(?P<x>b).*'), 'bc', True),
+                ((r'(a)\1.*', r'(b)\1.*'), 'bb', True),
+                ((r'(a)\1.*', r'(b)\1.*'), 'ba', False),
+        ]:
+            matcher = lint._compile_patterns(  # pylint: disable=W0212
+                patterns)
+            assert matcher is not None
+            self.assertEqual(bool(matcher(filename)), expected,
+                             (patterns, filename))
+
+    def test_allowlist_extensions(self) -> None:
+        """Tests lint._allowlist_extensions()."""
+
+        for patterns, expected in [
+                ((), frozenset()),
+                ((r'.*\.py$', ), frozenset(('py', ))),
+                ((r'.*\.py$', r'^src/.*\.(js|ts)$'),
+                 frozenset(('py', 'js', 'ts'))),
+                ((r'.*\.(?:vue)$', ), frozenset(('vue', ))),
+
+                # Patterns that could match other extensions.
+                ((r'.*\.py$', r'.*'), None),
+                ((r'.*\.py', ), None),
+                ((r'Dockerfile|.*\.py$', ), None),
+                ((r'(?i).*\.py$', ), None),
+                ((r'.*\\.py$', ), None),
+        ]:
+            self.assertEqual(
+                lint._allowlist_extensions(  # pylint: disable=W0212
+                    patterns),
+                expected, patterns)
+
+    def test_allowlist_suffixes(self) -> None:
+        """Tests lint._allowlist_suffixes()."""
+
+        for patterns, expected in [
+                ((r'.*\.py$', ), ('.py', )),
+                ((r'^.*\.(js|ts)$', r'.*\.vue$'), ('.js', '.ts', '.vue')),
+
+                # Patterns that look at more than the extension.
+                ((r'^src/.*\.py$', ), None),
+                ((r'.*\.py$', r'\.js$'), None),
+                ((r'.*\.py$', r'.*'), None),
+        ]:
+            self.assertEqual(
+                lint._allowlist_suffixes(  # pylint: disable=W0212
+                    patterns),
+                expected, patterns)
+
+    def test_split_batches(self) -> None:
+        """Tests lint._split_batches()."""
+
+        filenames = [f'{i}.py' for i in range(5)]
+        for max_batch_size, jobs, expected in [
+                (128, 1, [filenames]),
+                (128, 2, [filenames[:3], filenames[3:]]),
+                (2, 1, [filenames[:2], filenames[2:4], filenames[4:]]),
+                (128, 8, [[filename] for filename in filenames]),
+        ]:
+            self.assertEqual(
+                lint._split_batches(  # pylint: disable=W0212
+                    filenames, max_batch_size, jobs),
+                expected, (max_batch_size, jobs))
+
+    def test_executors(self) -> None:
+        """Tests that small runs don't start a process pool."""
+
+        with lint._Executors(4) as executors:  # pylint: disable=W0212
+            self.assertIsInstance(
+                executors.get(linters.WhitespaceLinter(), 3),
+                concurrent.futures.ThreadPoolExecutor)
+
+    def test_process_pool(self) -> None:
+        """Tests that a guarded wrapper of lint.main() can use processes."""
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            subprocess.check_call(['git', 'init', '-q'], cwd=tmpdir)
+            with open(os.path.join(tmpdir, '.lint.config.json'), 'w',
+                      encoding='utf-8') as config_file:
+                json.dump({'lint': {'whitespace': {
+                    'allowlist': [r'.*\.txt$'],
+                }}}, config_file)
+            for filename in ('a.txt', 'b.txt'):
+                with open(os.path.join(tmpdir, filename),
+                          'wb') as txt_file:
+                    txt_file.write(b'hello \n')
+            subprocess.check_call(['git', 'add', '.'], cwd=tmpdir)
+
+            env = dict(os.environ)
+            env['PYTHONPATH'] = os.pathsep.join([
+                os.path.dirname(os.path.dirname(lint.__file__)),
+                env.get('PYTHONPATH', ''),
+            ])
+            result = subprocess.run(
+                [sys.executable,
+                 os.path.join(os.path.dirname(__file__), 'data',
+                              'process_pool_lint.py'),
+                 '--continuous-integration', '-j2', 'validate',
+                 '--all-files'],
+                cwd=tmpdir, env=env, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, check=False)
+        self.assertEqual(result.returncode, 1, result.stdout)
+        self.assertIn(b'trailing whitespace', result.stdout)
+        self.assertNotIn(b'Traceback', result.stdout)
+
+    def test_file_contents_cache(self) -> None:
+        """Tests that cached file contents only live for a single run."""
+
+        # pylint: disable=protected-access
+        with lint._Executors(1):
+            lint._FILE_CONTENTS_CACHE['foo.py'] = b'foo\n'
+        self.assertEqual(lint._FILE_CONTENTS_CACHE, {})
+
+    def test_extension(self) -> None:
+        """Tests lint._extension()."""
+
+        for filename, expected in [
+                ('foo.py', 'py'),
+                ('foo', ''),
+                ('.py', 'py'),
+                ('foo.d/bar', ''),
+                ('foo/bar.tar.gz', 'gz'),
+        ]:
+            self.assertEqual(
+                lint._extension(filename),  # pylint: disable=W0212
+                expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
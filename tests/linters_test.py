@@ -5,11 +5,23 @@
 
 from __future__ import print_function
 
+import functools
 import unittest
 
 from omegaup_hook_tools import linters
 
 
+@functools.lru_cache(maxsize=None)
+def _has_program(program: str) -> bool:
+    """Returns whether |program| can be found by the linters."""
+
+    try:
+        linters._which(program)  # pylint: disable=protected-access
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return True
+
+
 class TestLinters(unittest.TestCase):
     """Tests the linters."""
 
@@ -18,40 +30,39 @@ class TestLinters(unittest.TestCase):
 
         linter = linters.WhitespaceLinter()
 
-        self.assertEqual(
-            linter.run_one('test.txt', b'Hello\r\nWorld!\n'),
-            linters.SingleResult(b'Hello\nWorld!\n', ['Windows-style EOF']))
-
-        self.assertEqual(
-            linter.run_one('test.txt', b'Hello\n\n\nWorld!\n'),
-            linters.SingleResult(b'Hello\n\nWorld!\n',
-                                 ['consecutive empty lines']))
-
-        self.assertEqual(
-            linter.run_one('test.txt', b'function() {\n\n}\n'),
-            linters.SingleResult(b'function() {\n}\n',
-                                 ['empty lines after an opening brace']))
-
-        self.assertEqual(
-            linter.run_one('test.txt', b'function() {\n//\n\n}\n'),
-            linters.SingleResult(b'function() {\n//\n}\n',
-                                 ['empty lines before a closing brace']))
-
-        self.assertEqual(
-            linter.run_one('test.txt', 'hello \u200b\n'.encode('utf-8')),
-            linters.SingleResult(b'hello\n', [
-                'trailing whitespace',
-            ]))
-
-        self.assertEqual(
-            linter.run_one('test.txt', b'function() {\r\n\n\n// \n\n}\n'),
-            linters.SingleResult(b'function() {\n//\n}\n', [
-                'Windows-style EOF',
-                'trailing whitespace',
-                'consecutive empty lines',
-                'empty lines after an opening brace',
-                'empty lines before a closing brace',
-            ]))
+        for contents, expected in [
+                (b'Hello\r\nWorld!\n',
+                 linters.SingleResult(b'Hello\nWorld!\n',
+                                      ['Windows-style EOF'])),
+                (b'Hello\n\n\nWorld!\n',
+                 linters.SingleResult(b'Hello\n\nWorld!\n',
+                                      ['consecutive empty lines'])),
+                (b'function() {\n\n}\n',
+                 linters.SingleResult(b'function() {\n}\n',
+                                      ['empty lines after an opening brace'])),
+                (b'function() {\n//\n\n}\n',
+                 linters.SingleResult(b'function() {\n//\n}\n',
+                                      ['empty lines before a closing brace'])),
+                ('hello \u200b\n'.encode('utf-8'),
+                 linters.SingleResult(b'hello\n', [
+                     'trailing whitespace',
+                 ])),
+                (b'function() {\r\n\n\n// \n\n}\n',
+                 linters.SingleResult(b'function() {\n//\n}\n', [
+                     'Windows-style EOF',
+                     'trailing whitespace',
+                     'consecutive empty lines',
+                     'empty lines after an opening brace',
+                     'empty lines before a closing brace',
+                 ])),
+
+                # Files that are already clean are left untouched.
+                (b'function() {\n  return;\n}\n',
+                 linters.SingleResult(b'function() {\n  return;\n}\n', [])),
+        ]:
+            with self.subTest(contents=contents):
+                self.assertEqual(linter.run_one('test.txt', contents),
+                                 expected)
 
     def test_command(self) -> None:
         """Tests CommandLinter."""
@@ -63,6 +74,21 @@ class TestLinters(unittest.TestCase):
         self.assertEqual(linter.run_one('test.txt', b'Hello, World!\n'),
                          linters.SingleResult(b'HELLO, WORLD!\n', ['command']))
 
+        # Commands that cannot be executed directly are run through bash.
+        linter = linters.CommandLinter({
+            'commands': ['tests/data/uppercase_linter.sh'],
+        })
+        self.assertEqual(linter.run_one('test.txt', b'Hello, World!\n'),
+                         linters.SingleResult(b'HELLO, WORLD!\n', ['command']))
+
+        linter = linters.CommandLinter({
+            'commands': ['tests/data/does_not_exist.sh'],
+        })
+        with self.assertRaisesRegex(linters.LinterException,
+                                    'No such file or directory'):
+            linter.run_one('test.txt', b'Hello, World!\n')
+
+    @unittest.skipUnless(_has_program('prettier'), 'prettier not installed')
     def test_javascript(self) -> None:
         """Tests JavaScriptLinter."""
 
@@ -78,6 +104,7 @@ class TestLinters(unittest.TestCase):
             linters.SingleResult(b'#!/usr/bin/node\nreturn;\n',
                                  ['javascript']))
 
+    @unittest.skipUnless(_has_program('prettier'), 'prettier not installed')
     def test_vue(self) -> None:
         """Tests VueLinter."""
 
@@ -105,6 +132,23 @@ class TestLinters(unittest.TestCase):
             linters.SingleResult(b'<template>\n  <b></b>\n</template>\n',
                                  ['vue']))
 
+    def test_vue_parser(self) -> None:
+        """Tests VueHTMLParser."""
+
+        parser = linters.VueHTMLParser()
+        self.assertEqual(
+            parser.parse(
+                '<template>\n<b></b>\n</template>\n'
+                '<script lang="ts">\n\nfoo\n  </script>\n'
+                '<style>a {}</style>\n', 'test.vue'),
+            [
+                ('template', [], '<template>', '<b></b>'),
+                ('script', [('lang', 'ts')], '<script lang="ts">',
+                 '\nfoo\n  '),
+                ('style', [], '<style>', 'a {}'),
+            ])
+
+    @unittest.skipUnless(_has_program('prettier'), 'prettier not installed')
     def test_html(self) -> None:
         """Tests HTMLLinter."""
 
@@ -119,6 +163,7 @@ class TestLinters(unittest.TestCase):
                 b'  </head>\n  <body>\n    <input />\n  </body>\n</html>\n',
                 ['html']))
 
+    @unittest.skipUnless(_has_program('phpcbf'), 'phpcbf not installed')
     def test_php(self) -> None:
         """Tests PHPLinter."""
 
@@ -168,6 +213,31 @@ class TestLinters(unittest.TestCase):
             ),
         ])
 
+    def test_python_run_all(self) -> None:
+        """Tests PythonLinter.run_all()."""
+
+        linter = linters.PythonLinter()
+        contents = {
+            # Packages must keep their names, instead of being linted as a
+            # module named after the temporary directory they are staged in.
+            'pkg/__init__.py': b'"""Docstring."""\n',
+            'pkg/test.py': b'"""Docstring."""\n',
+            'bar/test.py': b'"""Docstring."""\nimport os\n',
+        }
+
+        self.assertFalse(linter.supports_one)
+        with self.assertRaisesRegex(linters.LinterException,
+                                    'Python lint errors') as lex:
+            linter.run_all(sorted(contents), contents.__getitem__)
+        self.assertEqual(lex.exception.diagnostics, [
+            linters.Diagnostic(
+                message="[pylint] W0611(unused-import) Unused import os",
+                filename='bar/test.py',
+                line='import os',
+                lineno=2,
+            ),
+        ])
+
 
 if __name__ == '__main__':
     unittest.main()